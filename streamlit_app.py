@@ -1,18 +1,56 @@
 import streamlit as st
+import gc
+import hashlib
 import os
 import subprocess
-from tempfile import NamedTemporaryFile
-from faster_whisper import WhisperModel
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from tempfile import TemporaryDirectory
 
 st.set_page_config(page_title="AI Notes Transcriber")
 
 st.title("🧠 AI Notes Transcriber")
 
+WHISPER_SIZE = os.environ.get("WHISPER_SIZE", "small")
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    # Containers usually see every host core but are limited by a cgroup quota.
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, int(quota) // int(period)))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+WHISPER_THREADS = int(os.environ.get("WHISPER_THREADS", 0)) or available_cpus()
+
 @st.cache_resource
 def load_model():
-    return WhisperModel("medium", device="cpu", compute_type="int8")
+    from faster_whisper import BatchedInferencePipeline, WhisperModel
+
+    return BatchedInferencePipeline(
+        model=WhisperModel(
+            WHISPER_SIZE,
+            device="cpu",
+            compute_type="int8",
+            cpu_threads=WHISPER_THREADS,
+        )
+    )
+
+@st.cache_resource
+def prewarm_model():
+    # Load the model in the background so it is ready by the first upload.
+    threading.Thread(target=load_model, daemon=True).start()
 
-model = load_model()
+prewarm_model()
 
 LANG_MAP = {
     "en": "English",
@@ -23,14 +61,30 @@ LANG_MAP = {
     "ml": "Malayalam",
 }
 
-def convert_audio(in_path):
-    out = in_path.rsplit(".", 1)[0] + "_clean.wav"
-    subprocess.run(
-        ["ffmpeg", "-y", "-i", in_path, "-ac", "1", "-ar", "16000", out],
-        stdout=subprocess.DEVNULL,
+SAMPLE_RATE = 16000
+MAX_TRANSCRIPTS = 16
+STREAM_INTERVAL = 0.5
+
+def decode_audio(in_path):
+    out = subprocess.run(
+        [
+            "ffmpeg", "-nostdin", "-i", in_path,
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1",
+        ],
+        stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL,
+    ).stdout
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+def transcribe(audio, language):
+    segments, info = load_model().transcribe(
+        audio,
+        language=language,
+        batch_size=8,
+        beam_size=1,
     )
-    return out
+    return segments
 
 src_lang = st.selectbox(
     "Spoken Language",
@@ -40,19 +94,51 @@ src_lang = st.selectbox(
 
 uploaded = st.file_uploader("Upload audio", type=["wav", "mp3", "m4a"])
 
+if "transcripts" not in st.session_state:
+    st.session_state.transcripts = OrderedDict()
+transcripts = st.session_state.transcripts
+
+key = None
 if uploaded:
-    with NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-        tmp.write(uploaded.read())
-        raw = tmp.name
+    data = uploaded.getvalue()
+    key = (hashlib.blake2b(data, digest_size=8).hexdigest(), src_lang)
 
-    clean = convert_audio(raw)
+if st.sidebar.button("Clear caches"):
+    # Keep the transcript on screen so clearing doesn't re-transcribe it.
+    kept = transcripts.get(key)
+    transcripts.clear()
+    if kept is not None:
+        transcripts[key] = kept
+    gc.collect()
 
-    with st.spinner("Transcribing..."):
-        segments, info = model.transcribe(
-            clean,
-            language=src_lang,
-            vad_filter=True
-        )
+if uploaded:
+    if key in transcripts:
+        transcripts.move_to_end(key)
+    else:
+        with TemporaryDirectory() as tmp_dir:
+            raw = os.path.join(tmp_dir, "raw.wav")
+            with open(raw, "wb") as f:
+                f.write(data)
+            audio = decode_audio(raw)
+
+        if len(audio) <= SAMPLE_RATE // 2:
+            st.error("Could not read any audio from this file.")
+            st.stop()
+
+        placeholder = st.empty()
+        parts = []
+        last_update = 0.0
+        with st.spinner("Transcribing..."):
+            for seg in transcribe(audio, src_lang):
+                parts.append(seg.text)
+                now = time.monotonic()
+                if now - last_update >= STREAM_INTERVAL:
+                    placeholder.text(" ".join(parts))
+                    last_update = now
+        placeholder.empty()
+        transcripts[key] = " ".join(parts)
+        while len(transcripts) > MAX_TRANSCRIPTS:
+            transcripts.popitem(last=False)
 
-    text = " ".join(s.text for s in segments)
+    text = transcripts[key]
     st.text_area("Transcription", text, height=300)